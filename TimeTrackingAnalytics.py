@@ -0,0 +1,371 @@
+'''
+Analytics over the tracked-time history stored in the time_history table. History is read from the
+database in columnar chunks into NumPy arrays and every statistic is accumulated with vectorized
+operations, so memory stays bounded by the chunk size and the number of tasks reported on, no matter
+how many intervals there are. Reading rows through sqlite3 dominates the run time, so large or repeated
+runs should read a snapshot written by TimeTrackingSnapshot instead of the database.
+This module has no GUI dependency and can be run headlessly from the command line.
+'''
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+
+from TimeTrackingSnapshot import Snapshot
+
+#Number of history rows read from the database per chunk
+CHUNK_SIZE = 500000
+
+#Constants for splitting intervals into calendar bins (in seconds)
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+#The unix epoch (1970-01-01) was a Thursday, so shifting timestamps by
+#three days makes a shifted time of 0 fall on a Monday at midnight
+EPOCH_WEEKDAY_SHIFT = 3 * SECONDS_PER_DAY
+
+#Intervals longer than this are rare and are found through their own partial
+#index (idx_time_history_long) when looking up the intervals overlapping a period
+LONG_INTERVAL_SECONDS = SECONDS_PER_DAY
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+#Interval durations are bucketed on a logarithmic scale (1 second up to
+#roughly two years) so per-task percentiles can be estimated without
+#keeping every duration in memory
+DURATION_BIN_EDGES = np.unique(np.round(np.logspace(0, np.log10(2 * 365 * SECONDS_PER_DAY), 97)).astype(np.int64))
+
+
+'''
+Reads the time history for one user (or every user when user_id is None) as a sequence of
+(task_id, start_time, end_time) NumPy arrays holding at most chunk_size rows each. Rows come in no
+particular order, since none of the statistics depend on it and sorting would cost a full table sort.
+'''
+def load_history_chunks(database, user_id=None, chunk_size=CHUNK_SIZE):
+    conn = sqlite3.connect(database)
+    cursor = conn.cursor()
+
+    #Using an SQL query, the code below selects every interval, given a
+    #user id when one was provided
+    if user_id is None:
+        cursor.execute("SELECT task_id, start_time, end_time FROM time_history")
+    else:
+        cursor.execute("SELECT task_id, start_time, end_time FROM time_history WHERE user_id = ?", (user_id,))
+
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            #Converts the fetched rows into one column per attribute
+            columns = np.array(rows, dtype=np.int64).T
+            yield columns[0], columns[1], columns[2]
+    finally:
+        conn.close()
+
+
+#Returns the offset from UTC in seconds of the computer's local time zone at each
+#timestamp, following daylight saving time. The zone is looked up once per distinct
+#hour in the timestamps, which is exact for zones that change their offset on the hour
+def local_utc_offsets(timestamps):
+    hours, hour_index = np.unique(np.asarray(timestamps) // SECONDS_PER_HOUR, return_inverse=True)
+    offsets = np.array([time.localtime(int(hour) * SECONDS_PER_HOUR).tm_gmtoff for hour in hours], dtype=np.int64)
+    return offsets[hour_index.ravel()]
+
+
+#Returns the number of seconds of each interval [start, end) that fall into every
+#bin of a repeating period, for example hours of the day or days of the week.
+#Each bin is handled as one vectorized pass over the chunk, so intervals crossing
+#bin or period boundaries are split exactly.
+def _periodic_bin_seconds(start, end, period, bin_width, shift):
+    bins = period // bin_width
+    totals = np.zeros(bins, dtype=np.int64)
+
+    start = start + shift
+    end = end + shift
+    start_periods, start_phase = np.divmod(start, period)
+    end_periods, end_phase = np.divmod(end, period)
+
+    for index in range(bins):
+        #Seconds covered in this bin from the beginning of time up to a timestamp
+        #is (whole periods * bin width) + the part of the current period in the bin
+        bin_start = index * bin_width
+        covered_before_end = end_periods * bin_width + np.clip(end_phase - bin_start, 0, bin_width)
+        covered_before_start = start_periods * bin_width + np.clip(start_phase - bin_start, 0, bin_width)
+        totals[index] = np.sum(covered_before_end - covered_before_start)
+
+    return totals
+
+
+#Splits every interval [start, end) at local midnight. Returns the index of the interval each
+#piece came from, the day number (days since the epoch in local time) of the piece and the
+#seconds in it. Intervals within one day give a single piece, so the output is rarely larger
+#than the input. utc_offset is one offset in seconds or an array with one per interval
+def split_by_day(start_time, end_time, utc_offset=0):
+    local_start = start_time + utc_offset
+    local_end = np.maximum(end_time + utc_offset, local_start)
+    first_day = local_start // SECONDS_PER_DAY
+    last_day = np.maximum((local_end - 1) // SECONDS_PER_DAY, first_day)
+    spans = last_day - first_day + 1
+
+    index = np.repeat(np.arange(len(spans)), spans)
+    piece_offsets = np.arange(len(index)) - np.repeat(np.cumsum(spans) - spans, spans)
+    days = first_day[index] + piece_offsets
+    seconds = (np.minimum(local_end[index], (days + 1) * SECONDS_PER_DAY)
+               - np.maximum(local_start[index], days * SECONDS_PER_DAY))
+    return index, days, np.maximum(seconds, 0)
+
+
+'''
+HistoryStatistics accumulates statistics over history chunks. Each call to update() consumes one chunk, so
+it can be fed from load_history_chunks() or any other columnar source. utc_offset moves the hour/day
+boundaries into the user's local time. It is either a fixed number of seconds or a function such as
+local_utc_offsets() that returns the offset at each timestamp, so intervals from both sides of a daylight
+saving change are placed correctly. Each interval is shifted by the offset at its start.
+'''
+class HistoryStatistics:
+    def __init__(self, utc_offset=0):
+        self.utc_offset = utc_offset
+
+        #Number of intervals and seconds seen so far
+        self.interval_count = 0
+        self.total_seconds = 0
+
+        #Seconds tracked in each hour of the day and each day of the week
+        self.hour_seconds = np.zeros(24, dtype=np.int64)
+        self.weekday_seconds = np.zeros(7, dtype=np.int64)
+
+        #Seconds tracked per day. first_day is the day number (days since the
+        #epoch in local time) of daily_seconds[0]
+        self.first_day = None
+        self.daily_seconds = np.zeros(0, dtype=np.int64)
+
+        #Seconds and duration histogram per task. task_ids holds the sorted ids of
+        #the tasks seen so far, and row i of the other arrays belongs to task_ids[i],
+        #so their size follows the number of tasks reported on, not the largest id
+        self.task_ids = np.zeros(0, dtype=np.int64)
+        self.task_seconds = np.zeros(0, dtype=np.int64)
+        self.task_duration_counts = np.zeros((0, len(DURATION_BIN_EDGES)), dtype=np.int32)
+
+    #Returns the rows of the given sorted, unique task ids in the per-task
+    #arrays, adding rows for tasks that have not been seen before
+    def _task_rows(self, chunk_tasks):
+        rows = np.searchsorted(self.task_ids, chunk_tasks)
+        known = rows < len(self.task_ids)
+        known[known] = self.task_ids[rows[known]] == chunk_tasks[known]
+        if known.all():
+            return rows
+
+        task_ids = np.union1d(self.task_ids, chunk_tasks)
+        old_rows = np.searchsorted(task_ids, self.task_ids)
+        task_seconds = np.zeros(len(task_ids), dtype=np.int64)
+        task_seconds[old_rows] = self.task_seconds
+        task_duration_counts = np.zeros((len(task_ids), len(DURATION_BIN_EDGES)), dtype=np.int32)
+        task_duration_counts[old_rows] = self.task_duration_counts
+
+        self.task_ids = task_ids
+        self.task_seconds = task_seconds
+        self.task_duration_counts = task_duration_counts
+        return np.searchsorted(self.task_ids, chunk_tasks)
+
+    #Grows the daily array so that it covers the days first_day..last_day
+    def _grow_days(self, first_day, last_day):
+        if self.first_day is None:
+            self.first_day = first_day
+        if first_day < self.first_day:
+            self.daily_seconds = np.concatenate([np.zeros(self.first_day - first_day, dtype=np.int64),
+                                                 self.daily_seconds])
+            self.first_day = first_day
+        length = last_day - self.first_day + 1
+        if length > len(self.daily_seconds):
+            self.daily_seconds = np.concatenate([self.daily_seconds,
+                                                 np.zeros(length - len(self.daily_seconds), dtype=np.int64)])
+
+    #Adds one chunk of intervals to the statistics
+    def update(self, task_id, start_time, end_time):
+        task_id = np.asarray(task_id, dtype=np.int64)
+        start_time = np.asarray(start_time, dtype=np.int64)
+        #Intervals with an end before their start are treated as empty
+        end_time = np.maximum(np.asarray(end_time, dtype=np.int64), start_time)
+        if len(task_id) == 0:
+            return
+
+        durations = end_time - start_time
+        self.interval_count += len(durations)
+        self.total_seconds += int(durations.sum())
+
+        utc_offset = self.utc_offset(start_time) if callable(self.utc_offset) else self.utc_offset
+        self.hour_seconds += _periodic_bin_seconds(start_time, end_time, SECONDS_PER_DAY, SECONDS_PER_HOUR,
+                                                   utc_offset)
+        self.weekday_seconds += _periodic_bin_seconds(start_time, end_time, SECONDS_PER_WEEK, SECONDS_PER_DAY,
+                                                      utc_offset + EPOCH_WEEKDAY_SHIFT)
+
+        #Daily totals split intervals that cross local midnight between the days
+        _, days, day_seconds = split_by_day(start_time, end_time, utc_offset)
+        self._grow_days(int(days.min()), int(days.max()))
+        self.daily_seconds += np.bincount(days - self.first_day, weights=day_seconds,
+                                          minlength=len(self.daily_seconds)).astype(np.int64)
+
+        #Per-task totals and duration histograms are accumulated with one
+        #bincount over a flattened (task, duration bin) index. Only the tasks
+        #present in the chunk are counted, so the work is independent of how
+        #many tasks exist in total
+        chunk_tasks, task_index = np.unique(task_id, return_inverse=True)
+        task_rows = self._task_rows(chunk_tasks)
+        self.task_seconds[task_rows] += np.bincount(task_index, weights=durations).astype(np.int64)
+        bin_count = len(DURATION_BIN_EDGES)
+        duration_bins = np.searchsorted(DURATION_BIN_EDGES, durations, side="right") - 1
+        duration_bins = np.clip(duration_bins, 0, bin_count - 1)
+        flat_counts = np.bincount(task_index * bin_count + duration_bins, minlength=len(chunk_tasks) * bin_count)
+        self.task_duration_counts[task_rows] += flat_counts.reshape(len(chunk_tasks), bin_count).astype(np.int32)
+
+    #Returns the first local date covered by the daily totals
+    def first_date(self):
+        if self.first_day is None:
+            return None
+        return date(1970, 1, 1) + timedelta(days=self.first_day)
+
+    #Returns the average seconds tracked per calendar day for each weekday,
+    #counting every day between the first and last tracked day
+    def weekday_averages(self):
+        averages = np.zeros(7, dtype=np.float64)
+        if self.first_day is None:
+            return averages
+        #Day numbers are shifted by three so that Monday is weekday 0
+        weekdays = (np.arange(self.first_day, self.first_day + len(self.daily_seconds)) + 3) % 7
+        day_counts = np.bincount(weekdays, minlength=7)
+        np.divide(self.weekday_seconds, day_counts, out=averages, where=day_counts > 0)
+        return averages
+
+    #Returns the rolling mean of the daily totals over the given number of days.
+    #The result has one value per day, starting at the window-th day
+    def rolling_daily_average(self, window=7):
+        if len(self.daily_seconds) < window:
+            return np.zeros(0, dtype=np.float64)
+        cumulative = np.concatenate([[0], np.cumsum(self.daily_seconds)])
+        return (cumulative[window:] - cumulative[:-window]) / window
+
+    #Returns a dictionary of task id -> estimated interval duration (in seconds) at
+    #each of the given percentiles. Estimates are the lower edge of the log-scale
+    #duration bucket holding the percentile, so they are accurate to about 20%.
+    def task_percentiles(self, percentiles=(50, 90, 99)):
+        counts = self.task_duration_counts
+        totals = counts.sum(axis=1, dtype=np.int64)
+        if len(totals) == 0:
+            return {}
+
+        cumulative = np.cumsum(counts, axis=1, dtype=np.int64)
+        results = np.empty((len(totals), len(percentiles)), dtype=np.int64)
+        for column, percentile in enumerate(percentiles):
+            #The rank of the percentile within each task's intervals
+            ranks = np.ceil(totals * (percentile / 100.0)).astype(np.int64)
+            ranks = np.maximum(ranks, 1)
+            bins = (cumulative < ranks[:, None]).sum(axis=1)
+            results[:, column] = DURATION_BIN_EDGES[bins]
+
+        return {int(task_id): dict(zip(percentiles, map(int, row))) for task_id, row in zip(self.task_ids, results)}
+
+
+#Reads the history for one user (or every user) from the database and returns the
+#accumulated statistics. For tens of millions of rows use compute_snapshot_statistics
+def compute_statistics(database, user_id=None, utc_offset=0, chunk_size=CHUNK_SIZE):
+    statistics = HistoryStatistics(utc_offset)
+    for task_id, start_time, end_time in load_history_chunks(database, user_id, chunk_size):
+        statistics.update(task_id, start_time, end_time)
+    return statistics
+
+
+#Computes the same statistics from a columnar snapshot written by TimeTrackingSnapshot,
+#which skips the database entirely and reads the history as memory-mapped arrays
+def compute_snapshot_statistics(snapshot_dir, user_id=None, utc_offset=0, chunk_size=CHUNK_SIZE):
+    statistics = HistoryStatistics(utc_offset)
+    for task_id, start_time, end_time in Snapshot(snapshot_dir).history_chunks(user_id, chunk_size):
+        statistics.update(task_id, start_time, end_time)
+    return statistics
+
+
+#Formats a number of seconds as hours:minutes:seconds
+def format_seconds(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+#Returns a dictionary of task id -> task name for the tasks of one user (or every user)
+def load_task_names(database, user_id=None):
+    conn = sqlite3.connect(database)
+    cursor = conn.cursor()
+    if user_id is None:
+        cursor.execute("SELECT task_id, task_name FROM task_list")
+    else:
+        cursor.execute("SELECT task_id, task_name FROM task_list WHERE user_id = ?", (user_id,))
+    task_names = dict(cursor.fetchall())
+    conn.close()
+    return task_names
+
+
+#Builds a plain text report of the statistics, used by both the command
+#line and the analytics window in the GUI
+def format_report(statistics, task_names=None, window=7):
+    task_names = task_names or {}
+    lines = [f"Intervals: {statistics.interval_count}",
+             f"Total tracked: {format_seconds(statistics.total_seconds)}",
+             ""]
+
+    lines.append("Time of day:")
+    for hour, seconds in enumerate(statistics.hour_seconds):
+        lines.append(f"  {hour:02d}:00  {format_seconds(seconds)}")
+    lines.append("")
+
+    lines.append("Average per weekday:")
+    for name, seconds in zip(WEEKDAY_NAMES, statistics.weekday_averages()):
+        lines.append(f"  {name:<10} {format_seconds(seconds)}")
+    lines.append("")
+
+    rolling = statistics.rolling_daily_average(window)
+    if len(rolling):
+        last_date = statistics.first_date() + timedelta(days=len(statistics.daily_seconds) - 1)
+        lines.append(f"{window}-day average ending {last_date}: {format_seconds(rolling[-1])} per day")
+        lines.append(f"Highest {window}-day average: {format_seconds(rolling.max())} per day")
+        lines.append("")
+
+    lines.append("Interval length per task (p50 / p90 / p99):")
+    for task_id, values in statistics.task_percentiles().items():
+        name = task_names.get(task_id, f"Task {task_id}")
+        lines.append(f"  {name}: " + " / ".join(format_seconds(value) for value in values.values()))
+
+    return "\n".join(lines)
+
+
+'''
+Command line entry point for producing a report without starting the GUI, e.g.
+python TimeTrackingAnalytics.py time_tracking.db --user-id 1
+The source may also be a snapshot directory written by TimeTrackingSnapshot.
+'''
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report statistics over tracked-time history.")
+    parser.add_argument("source", help="path to the time_tracking.db file or a snapshot directory")
+    parser.add_argument("--user-id", type=int, default=None, help="only report on this user")
+    parser.add_argument("--utc-offset", type=float, default=0, help="local time offset from UTC in hours")
+    parser.add_argument("--local-time", action="store_true",
+                        help="use this computer's time zone, including daylight saving, instead of --utc-offset")
+    parser.add_argument("--window", type=int, default=7, help="number of days in the rolling average")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="history rows read per chunk")
+    args = parser.parse_args(argv)
+
+    utc_offset = local_utc_offsets if args.local_time else int(args.utc_offset * 3600)
+    if os.path.isdir(args.source):
+        statistics = compute_snapshot_statistics(args.source, args.user_id, utc_offset, args.chunk_size)
+        task_names = Snapshot(args.source).task_names(args.user_id)
+    else:
+        statistics = compute_statistics(args.source, args.user_id, utc_offset, args.chunk_size)
+        task_names = load_task_names(args.source, args.user_id)
+    print(format_report(statistics, task_names, args.window))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
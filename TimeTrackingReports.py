@@ -0,0 +1,225 @@
+'''
+Batch generation of monthly timesheets for every account in the users table. Users are partitioned
+into small batches which are handed to a process pool, and every worker reads the database through its
+own read-only connection. The per-user results are merged into one timesheet file per user plus an
+aggregate file, and progress and failures are reported per user as batches complete.
+This module has no GUI dependency and is run from the command line.
+'''
+import os
+import sys
+import csv
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from TimeTrackingAnalytics import SECONDS_PER_DAY, LONG_INTERVAL_SECONDS, format_seconds, split_by_day
+
+#Number of batches created per worker process. Several small batches per
+#worker keep the pool balanced when some users have far more history
+BATCHES_PER_WORKER = 8
+
+
+#Opens a read-only connection to the database so that report workers can
+#never modify it, even by accident
+def connect_read_only(database):
+    return sqlite3.connect(Path(database).resolve().as_uri() + "?mode=ro", uri=True)
+
+
+#Returns the unix timestamps of the first second of the month and of the
+#following month, in local time shifted by utc_offset seconds
+def month_bounds(year, month, utc_offset=0):
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    epoch = date(1970, 1, 1)
+    return ((first - epoch).days * SECONDS_PER_DAY - utc_offset,
+            (following - epoch).days * SECONDS_PER_DAY - utc_offset)
+
+
+'''
+Worker function run in the process pool. It builds the timesheet of every user in user_ids for the
+month [month_start, month_end) and returns a list of (user_id, timesheet, error) tuples, where exactly
+one of timesheet and error is None. A timesheet is a dictionary holding the username, the rows of
+(date, task name, seconds) and the total seconds in the month. Intervals are split at local midnight the
+same way as in TimeTrackingAnalytics. Intervals that started before the month but run into it are found by
+reading LONG_INTERVAL_SECONDS further back through the start_time index, and the rare longer ones through
+the partial index of long intervals, so neither lookup scans the user's whole history.
+'''
+def generate_timesheets(database, user_ids, month_start, month_end, utc_offset=0):
+    results = []
+    conn = connect_read_only(database)
+    cursor = conn.cursor()
+
+    for user_id in user_ids:
+        try:
+            cursor.execute("SELECT username FROM users WHERE user_id = ?", (user_id,))
+            result = cursor.fetchone()
+            if result is None:
+                raise LookupError("User not found.")
+            username = result[0]
+
+            #Using SQL queries, the code below selects the part of each interval
+            #that falls inside the month. The second query only finds intervals
+            #longer than LONG_INTERVAL_SECONDS, which the first one cannot reach
+            lookback_start = month_start - LONG_INTERVAL_SECONDS
+            cursor.execute(
+                "SELECT task_id, MAX(start_time, ?), MIN(end_time, ?) FROM time_history "
+                "WHERE user_id = ? AND start_time >= ? AND start_time < ? AND end_time > ?",
+                (month_start, month_end, user_id, lookback_start, month_end, month_start))
+            rows = cursor.fetchall()
+            cursor.execute(
+                "SELECT task_id, ?, MIN(end_time, ?) FROM time_history "
+                f"WHERE user_id = ? AND end_time > ? AND end_time - start_time > {LONG_INTERVAL_SECONDS} "
+                "AND start_time < ?",
+                (month_start, month_end, user_id, month_start, lookback_start))
+            rows += cursor.fetchall()
+            intervals = np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+            #The intervals are split at local midnight and summed per day and task
+            pieces, days, seconds = split_by_day(intervals[:, 1], intervals[:, 2], utc_offset)
+            keys, key_index = np.unique(np.stack([days, intervals[pieces, 0]], axis=1), axis=0, return_inverse=True)
+            totals = np.bincount(key_index.ravel(), weights=seconds, minlength=len(keys)).astype(np.int64)
+
+            cursor.execute("SELECT task_id, task_name FROM task_list WHERE user_id = ?", (user_id,))
+            task_names = dict(cursor.fetchall())
+
+            rows = [(date(1970, 1, 1) + timedelta(days=int(day)), task_names.get(int(task_id), f"Task {task_id}"),
+                     int(total)) for (day, task_id), total in zip(keys, totals) if total > 0]
+            timesheet = {"username": username, "rows": rows, "total": sum(row[2] for row in rows)}
+            results.append((user_id, timesheet, None))
+        except Exception as error:
+            results.append((user_id, None, f"{type(error).__name__}: {error}"))
+
+    conn.close()
+    return results
+
+
+#Splits the user ids into batches of roughly equal size
+def partition_users(user_ids, batch_count):
+    batch_count = max(1, min(batch_count, len(user_ids)))
+    return [user_ids[index::batch_count] for index in range(batch_count)]
+
+
+#Prints one line of progress for a finished user
+def print_progress(done, total, user_id, error):
+    status = f"failed ({error})" if error else "ok"
+    print(f"[{done}/{total}] user {user_id}: {status}", file=sys.stderr)
+
+
+'''
+Generates the timesheets for every user (or the given user ids) with a pool of worker processes and
+returns a tuple of (timesheets, failures), dictionaries keyed by user id. progress is called with
+(done, total, user_id, error) as each user's result arrives.
+'''
+def generate_all_timesheets(database, year, month, user_ids=None, workers=None, utc_offset=0,
+                            progress=print_progress):
+    month_start, month_end = month_bounds(year, month, utc_offset)
+
+    conn = connect_read_only(database)
+    cursor = conn.cursor()
+    if user_ids is None:
+        cursor.execute("SELECT user_id FROM users ORDER BY user_id")
+        user_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+
+    workers = workers or os.cpu_count() or 1
+    batches = partition_users(user_ids, workers * BATCHES_PER_WORKER)
+
+    timesheets = {}
+    failures = {}
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generate_timesheets, database, batch, month_start, month_end, utc_offset):
+                   batch for batch in batches}
+
+        for future in as_completed(futures):
+            #If the worker itself failed (for example the process died), every
+            #user in its batch is reported as failed
+            try:
+                results = future.result()
+            except Exception as error:
+                results = [(user_id, None, f"{type(error).__name__}: {error}") for user_id in futures[future]]
+
+            for user_id, timesheet, error in results:
+                done += 1
+                if error:
+                    failures[user_id] = error
+                else:
+                    timesheets[user_id] = timesheet
+                if progress:
+                    progress(done, len(user_ids), user_id, error)
+
+    return timesheets, failures
+
+
+#Writes one timesheet file per user and an aggregate file with the total per user
+#and per task name, and returns the path of the aggregate file
+def write_timesheets(output_dir, year, month, timesheets, failures):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    period = f"{year:04d}-{month:02d}"
+
+    task_totals = {}
+    for user_id, timesheet in sorted(timesheets.items()):
+        with open(output_dir / f"timesheet_{period}_user_{user_id}.csv", "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["username", "date", "task", "seconds", "time"])
+            for day, task_name, seconds in timesheet["rows"]:
+                writer.writerow([timesheet["username"], day.isoformat(), task_name, seconds, format_seconds(seconds)])
+                task_totals[task_name] = task_totals.get(task_name, 0) + seconds
+
+    aggregate_path = output_dir / f"timesheet_{period}_aggregate.csv"
+    with open(aggregate_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["user_id", "username", "seconds", "time", "error"])
+        for user_id, timesheet in sorted(timesheets.items()):
+            writer.writerow([user_id, timesheet["username"], timesheet["total"], format_seconds(timesheet["total"]), ""])
+        for user_id, error in sorted(failures.items()):
+            writer.writerow([user_id, "", "", "", error])
+
+        writer.writerow([])
+        writer.writerow(["task", "seconds", "time"])
+        for task_name, seconds in sorted(task_totals.items(), key=lambda item: -item[1]):
+            writer.writerow([task_name, seconds, format_seconds(seconds)])
+
+    return aggregate_path
+
+
+#Parses a --month argument of the form YYYY-MM into (year, month)
+def parse_month(text):
+    try:
+        parsed = datetime.strptime(text, "%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid month {text!r}, expected YYYY-MM")
+    return parsed.year, parsed.month
+
+
+'''
+Command line entry point, e.g.
+python TimeTrackingReports.py time_tracking.db --month 2024-05 --output-dir reports
+'''
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate monthly timesheets for every user.")
+    parser.add_argument("database", help="path to the time_tracking.db file")
+    parser.add_argument("--month", type=parse_month, default=datetime.now().strftime("%Y-%m"),
+                        help="month to report on as YYYY-MM")
+    parser.add_argument("--output-dir", default="reports", help="directory the timesheets are written to")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids", help="only report on this user")
+    parser.add_argument("--utc-offset", type=float, default=0, help="local time offset from UTC in hours")
+    args = parser.parse_args(argv)
+
+    year, month = args.month
+    timesheets, failures = generate_all_timesheets(args.database, year, month, args.user_ids, args.workers,
+                                                   int(args.utc_offset * 3600))
+    aggregate_path = write_timesheets(args.output_dir, year, month, timesheets, failures)
+
+    print(f"{len(timesheets)} timesheets written, {len(failures)} failed. Aggregate: {aggregate_path}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+'''
+Columnar snapshot export of time_tracking.db for fast repeated analytics. A snapshot is a directory holding
+one fixed-width little-endian binary file per column of the users, tasks and time history tables, a string
+table for usernames and task names, and a header.json index naming the file of every column and the row
+counts.
+Readers open the columns with memory mapping, so every process reading a snapshot gets zero-copy NumPy
+views that share the same pages of the operating system's file cache. Refreshing an existing snapshot
+only appends the history rows added since the last export.
+'''
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+SNAPSHOT_VERSION = 2
+
+#Number of rows read from the database per chunk while exporting
+CHUNK_SIZE = 500000
+
+#The columns of every table in the snapshot, in the order they are selected from the
+#database, with their fixed-width NumPy dtype. Columns named name_ref hold indexes
+#into the string table instead of text
+TABLES = {
+    "users": {
+        "query": "SELECT user_id, username FROM users ORDER BY user_id",
+        "columns": [("user_id", "<i8"), ("name_ref", "<i8")],
+    },
+    "tasks": {
+        "query": "SELECT task_id, user_id, total_time, task_name FROM task_list ORDER BY task_id",
+        "columns": [("task_id", "<i8"), ("user_id", "<i8"), ("total_time", "<i8"), ("name_ref", "<i8")],
+    },
+    "history": {
+        "query": "SELECT history_id, task_id, user_id, start_time, end_time FROM time_history "
+                 "WHERE history_id > ? ORDER BY history_id",
+        "columns": [("history_id", "<i8"), ("task_id", "<i8"), ("user_id", "<i8"),
+                    ("start_time", "<i8"), ("end_time", "<i8")],
+    },
+}
+
+
+#Returns the file name of one column of a table written in the given generation
+def column_file_name(table, column, generation):
+    return f"{table}.{column}.{generation}.bin"
+
+
+#Returns the file names referenced by a header
+def header_file_names(header):
+    names = {header["strings"]["data"], header["strings"]["offsets"]}
+    for table in header["tables"].values():
+        names.update(table["files"].values())
+    return names
+
+
+'''
+SnapshotWriter exports the database into a snapshot directory. Every refresh is a new generation: the
+users and tasks tables and the string table are written to new files named after the generation, and
+header.json, which names the exact file of every column, is replaced atomically at the very end. A reader
+therefore always sees one complete generation. History files are the exception, as history rows are only
+ever inserted: new rows are appended to the existing files past the row count of every published header,
+and a new generation of history files is only written by export() or when rows went missing from the
+database. Files of the previous generation are kept so readers that just opened it can still map them.
+'''
+class SnapshotWriter:
+    def __init__(self, database, snapshot_dir):
+        self.database = database
+        self.snapshot_dir = Path(snapshot_dir)
+
+    #Writes a complete snapshot, replacing any existing one
+    def export(self):
+        return self.refresh(full=True)
+
+    #Updates the snapshot and returns its new header
+    def refresh(self, full=False):
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        previous_header = self._read_header()
+        header = None if full else previous_header
+        generation = previous_header["generation"] + 1 if previous_header else 1
+
+        conn = sqlite3.connect(self.database)
+        cursor = conn.cursor()
+
+        #The users and tasks tables are small and their rows change in place
+        #(renames and running timers), so they are always rewritten along with
+        #the string table of their names
+        strings = []
+        tables = {
+            "users": self._write_table(cursor, "users", strings, generation),
+            "tasks": self._write_table(cursor, "tasks", strings, generation),
+        }
+        string_files = self._write_strings(strings, generation)
+
+        #History rows are never updated or deleted by the application. If the
+        #database still holds every row the snapshot has, only rows after the
+        #last exported history_id are appended to the current history files
+        last_history_id = 0
+        history_rows = 0
+        history_files = {column: column_file_name("history", column, generation)
+                         for column, dtype in TABLES["history"]["columns"]}
+        if header is not None:
+            cursor.execute("SELECT COUNT(*) FROM time_history WHERE history_id <= ?", (header["last_history_id"],))
+            if cursor.fetchone()[0] == header["tables"]["history"]["rows"]:
+                last_history_id = header["last_history_id"]
+                history_rows = header["tables"]["history"]["rows"]
+                history_files = header["tables"]["history"]["files"]
+
+        appended_rows, appended_last_id = self._append_history(cursor, last_history_id, history_rows, history_files)
+        tables["history"] = {"rows": history_rows + appended_rows, "columns": TABLES["history"]["columns"],
+                             "files": history_files}
+
+        conn.close()
+
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "generation": generation,
+            "last_history_id": max(last_history_id, appended_last_id),
+            "strings": string_files,
+            "tables": tables,
+        }
+        #The header is replaced last and in one step, so readers see either the
+        #previous generation or this one, never a mix of the two
+        temporary_path = self.snapshot_dir / "header.json.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(header, file, indent=2)
+        os.replace(temporary_path, self.snapshot_dir / "header.json")
+
+        self._remove_old_files(header, previous_header)
+        return header
+
+    #Returns the header of the existing snapshot, or None if there is none
+    def _read_header(self):
+        try:
+            with open(self.snapshot_dir / "header.json") as file:
+                header = json.load(file)
+        except FileNotFoundError:
+            return None
+        return header if header.get("version") == SNAPSHOT_VERSION else None
+
+    #Deletes the column files that neither the new nor the previous header
+    #refers to, including files left behind by an interrupted refresh. On
+    #Windows a file still mapped by a reader cannot be deleted, so it is
+    #left for a later refresh instead of failing one that is already published
+    def _remove_old_files(self, header, previous_header):
+        keep = header_file_names(header)
+        if previous_header is not None:
+            keep |= header_file_names(previous_header)
+        for path in self.snapshot_dir.glob("*.bin"):
+            if path.name not in keep:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    #Writes every column of the users or tasks table to new files. The text in
+    #the last selected column is added to strings and replaced by its index
+    def _write_table(self, cursor, table, strings, generation):
+        columns = TABLES[table]["columns"]
+        cursor.execute(TABLES[table]["query"])
+        rows = cursor.fetchall()
+
+        names = [row[-1] or "" for row in rows]
+        values = np.array([row[:-1] for row in rows], dtype=np.int64).reshape(len(rows), len(columns) - 1)
+        name_refs = np.arange(len(strings), len(strings) + len(rows), dtype=np.int64)
+        strings.extend(names)
+
+        files = {}
+        for index, (column, dtype) in enumerate(columns):
+            data = name_refs if column == "name_ref" else values[:, index]
+            files[column] = column_file_name(table, column, generation)
+            np.ascontiguousarray(data, dtype=dtype).tofile(self.snapshot_dir / files[column])
+
+        return {"rows": len(rows), "columns": columns, "files": files}
+
+    #Writes the string table as the concatenated UTF-8 bytes of every string
+    #plus an offsets column with one more entry than there are strings
+    def _write_strings(self, strings, generation):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        offsets[1:] = np.cumsum([len(data) for data in encoded], dtype=np.int64)
+
+        string_files = {"count": len(strings), "data": f"strings.{generation}.bin",
+                        "offsets": f"strings.offsets.{generation}.bin"}
+        with open(self.snapshot_dir / string_files["data"], "wb") as file:
+            file.write(b"".join(encoded))
+        offsets.tofile(self.snapshot_dir / string_files["offsets"])
+        return string_files
+
+    #Writes the history rows after last_history_id in chunks to the given files,
+    #appending after existing_rows rows. Returns the number of rows written and
+    #the last history_id written
+    def _append_history(self, cursor, last_history_id, existing_rows, history_files):
+        columns = TABLES["history"]["columns"]
+        paths = [self.snapshot_dir / history_files[column] for column, dtype in columns]
+
+        #An interrupted refresh can leave rows past the end recorded in the
+        #header, so the files are cut back to the header before appending.
+        #Published headers never refer to rows past this point, so readers
+        #mapping the files are not affected
+        for (column, dtype), path in zip(columns, paths):
+            with open(path, "ab") as file:
+                file.truncate(existing_rows * np.dtype(dtype).itemsize)
+        files = [open(path, "ab") for path in paths]
+
+        written = 0
+        try:
+            cursor.execute(TABLES["history"]["query"], (last_history_id,))
+            while True:
+                rows = cursor.fetchmany(CHUNK_SIZE)
+                if not rows:
+                    break
+                values = np.array(rows, dtype=np.int64)
+                for index, ((column, dtype), file) in enumerate(zip(columns, files)):
+                    np.ascontiguousarray(values[:, index], dtype=dtype).tofile(file)
+                written += len(rows)
+                last_history_id = int(values[-1, 0])
+        finally:
+            for file in files:
+                file.close()
+
+        return written, last_history_id
+
+
+'''
+Snapshot opens a snapshot directory for reading. The header is read once and every column it names is
+memory mapped straight away, so the reader holds one consistent generation even if a refresh publishes a
+newer one meanwhile. Columns are read-only NumPy memory maps, so opening a snapshot is instant and its
+pages are shared by every process that reads it.
+'''
+class Snapshot:
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = Path(snapshot_dir)
+        with open(self.snapshot_dir / "header.json") as file:
+            self.header = json.load(file)
+        if self.header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {self.header.get('version')}")
+
+        self._columns = {}
+        for table, info in self.header["tables"].items():
+            for column, dtype in info["columns"]:
+                self._columns[(table, column)] = self._map(info["files"][column], dtype, info["rows"])
+
+        string_files = self.header["strings"]
+        self._strings = self._map(string_files["data"], np.uint8,
+                                  os.path.getsize(self.snapshot_dir / string_files["data"]))
+        self._offsets = self._map(string_files["offsets"], "<i8", string_files["count"] + 1)
+
+    #Returns the number of rows in a table
+    def rows(self, table):
+        return self.header["tables"][table]["rows"]
+
+    #Returns one column of a table as a read-only array
+    def column(self, table, column):
+        return self._columns[(table, column)]
+
+    #Memory maps the first rows entries of a column file. History files may be
+    #longer than the header says while a refresh is appending to them
+    def _map(self, file_name, dtype, rows):
+        if rows == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.snapshot_dir / file_name, dtype=dtype, mode="r", shape=(rows,))
+
+    #Returns the string with the given index from the string table
+    def string(self, index):
+        return bytes(self._strings[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+    #Returns a dictionary of task id -> task name for one user (or every user)
+    def task_names(self, user_id=None):
+        task_ids = self.column("tasks", "task_id")
+        name_refs = self.column("tasks", "name_ref")
+        if user_id is not None:
+            selected = self.column("tasks", "user_id") == user_id
+            task_ids, name_refs = task_ids[selected], name_refs[selected]
+        return {int(task_id): self.string(name_ref) for task_id, name_ref in zip(task_ids, name_refs)}
+
+    #Reads the time history for one user (or every user when user_id is None) as a
+    #sequence of (task_id, start_time, end_time) arrays of at most chunk_size rows,
+    #in the same form as TimeTrackingAnalytics.load_history_chunks(). Without a
+    #user_id the arrays are zero-copy views of the mapped columns
+    def history_chunks(self, user_id=None, chunk_size=CHUNK_SIZE):
+        task_id = self.column("history", "task_id")
+        start_time = self.column("history", "start_time")
+        end_time = self.column("history", "end_time")
+        user_ids = self.column("history", "user_id")
+
+        for start in range(0, self.rows("history"), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            if user_id is None:
+                yield task_id[chunk], start_time[chunk], end_time[chunk]
+            else:
+                selected = user_ids[chunk] == user_id
+                if selected.any():
+                    yield task_id[chunk][selected], start_time[chunk][selected], end_time[chunk][selected]
+
+
+'''
+Command line entry point for creating or refreshing a snapshot, e.g.
+python TimeTrackingSnapshot.py time_tracking.db snapshot
+'''
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export time_tracking.db as a memory-mappable columnar snapshot.")
+    parser.add_argument("database", help="path to the time_tracking.db file")
+    parser.add_argument("snapshot_dir", help="directory the snapshot is written to")
+    parser.add_argument("--full", action="store_true", help="rewrite the whole snapshot instead of appending")
+    args = parser.parse_args(argv)
+
+    header = SnapshotWriter(args.database, args.snapshot_dir).refresh(full=args.full)
+    print(", ".join(f"{table}: {info['rows']} rows" for table, info in header["tables"].items()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
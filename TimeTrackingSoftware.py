@@ -3,14 +3,18 @@ Defined library imports necessary for program functionality (primarily using the
 '''
 import sys
 import sqlite3
+import time
+from collections import deque
 from datetime import timedelta
 
 from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QTextEdit, \
     QInputDialog, QListWidget, QListWidgetItem, QStackedWidget, QCalendarWidget, QDialog, QDialogButtonBox, QMessageBox, \
-    QHBoxLayout, QCheckBox
-from PyQt6.QtCore import Qt, QTimer
+    QHBoxLayout, QCheckBox, QComboBox, QTreeWidget, QTreeWidgetItem
+from PyQt6.QtCore import Qt, QTimer, QObject, QEvent, QPoint
 from PyQt6.QtGui import QFont, QIcon
 
+import TimeTrackingAnalytics
+
 '''
 Database table configuration handles and maintains user information. Table records are initialized here
 for the user, and a foreign key id will link created accounts to both the user_settings and task_list table.
@@ -35,7 +39,8 @@ def create_database_and_tables(database):
     # Using an SQL query, the code below creates a table named
     # 'task_list' and its attributes are task_id(INTEGER), user_id
     # (INTEGER), task_name(TEXT), total_time(INTEGER set to 0 by default),
-    # and task_description(TEXT)
+    # task_description(TEXT) and project_id(INTEGER, NULL when the
+    # task is not part of a project)
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS task_list (
@@ -44,11 +49,19 @@ def create_database_and_tables(database):
             task_name TEXT NOT NULL,
             total_time INTEGER DEFAULT 0,
             task_description TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
+            project_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (project_id) REFERENCES projects (project_id)
         );
         """
     )
 
+    # Databases created before projects existed have no project_id
+    # column in task_list, so it is added to them here
+    task_list_columns = [row[1] for row in conn.execute("PRAGMA table_info(task_list)")]
+    if "project_id" not in task_list_columns:
+        conn.execute("ALTER TABLE task_list ADD COLUMN project_id INTEGER REFERENCES projects (project_id)")
+
     # Using an SQL query, the code below creates a table named 'users'
     # with the attributes user_id(INTEGER), username(TEXT) and password(TEXT)
     # The user_id is a foreign key
@@ -61,6 +74,116 @@ def create_database_and_tables(database):
         );
         """
     )
+
+    # Using an SQL query, the code below creates a table named 'time_history'
+    # which stores one row per tracked interval of a task. start_time and
+    # end_time are unix timestamps in seconds, and user_id is copied from the
+    # task so that history can be read per user without a join
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS time_history (
+            history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            start_time INTEGER NOT NULL,
+            end_time INTEGER NOT NULL,
+            FOREIGN KEY (task_id) REFERENCES task_list (task_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        );
+        """
+    )
+
+    # The index below lets the analytics read one user's history in
+    # start_time order without scanning the whole table
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_time_history_user_start
+        ON time_history (user_id, start_time);
+        """
+    )
+
+    # The partial index below holds only the rare intervals longer than
+    # LONG_INTERVAL_SECONDS, such as a timer left running for weeks, so
+    # reports can find the ones reaching into a month without a scan
+    conn.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_time_history_long
+        ON time_history (user_id, end_time)
+        WHERE end_time - start_time > {TimeTrackingAnalytics.LONG_INTERVAL_SECONDS};
+        """
+    )
+
+    # Using an SQL query, the code below creates a table named 'projects'
+    # with the attributes project_id(INTEGER), user_id(INTEGER), parent_id
+    # (INTEGER, NULL for top level projects) and project_name(TEXT)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS projects (
+            project_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            parent_id INTEGER,
+            project_name TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (parent_id) REFERENCES projects (project_id)
+        );
+        """
+    )
+
+    # Using an SQL query, the code below creates the closure table of the
+    # project hierarchy. It holds one row for every project and each of its
+    # ancestors (including itself at depth 0), so all subprojects of a
+    # project can be found with one indexed lookup on ancestor_id
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS project_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id),
+            FOREIGN KEY (ancestor_id) REFERENCES projects (project_id),
+            FOREIGN KEY (descendant_id) REFERENCES projects (project_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_project_closure_descendant ON project_closure (descendant_id)")
+
+    # Using an SQL query, the code below creates a table named 'tags' with
+    # one row per tag name of a user, and a table named 'task_tags' which
+    # links tags to tasks
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tags (
+            tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            tag_name TEXT NOT NULL,
+            UNIQUE (user_id, tag_name),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS task_tags (
+            task_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            PRIMARY KEY (task_id, tag_id),
+            FOREIGN KEY (task_id) REFERENCES task_list (task_id),
+            FOREIGN KEY (tag_id) REFERENCES tags (tag_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_task_tags_tag ON task_tags (tag_id, task_id)")
+
+    # The indexes below let tasks be found per user and per project.
+    # total_time is left out of the keys because it changes every second
+    # while a task runs, and every change would also update the index.
+    # Earlier databases had it in the keys, so those indexes are rebuilt
+    for index_name in ("idx_task_list_user", "idx_task_list_project"):
+        index_columns = [row[2] for row in conn.execute(f"PRAGMA index_info({index_name})")]
+        if "total_time" in index_columns:
+            conn.execute(f"DROP INDEX {index_name}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_task_list_user ON task_list (user_id, project_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_task_list_project ON task_list (project_id)")
     #confirms changes made to the database
     conn.commit()
     conn.close()
@@ -158,11 +281,15 @@ that is a simple list widget. This module will be unique to each user's task lis
 allow for the individual creation and manipulation (start/stop/edit/delete) of individual units.
 '''
 class TaskWidget(QWidget):
-    def __init__(self, task_id, task_name, total_time, task_description):
+    def __init__(self, task_id, task_name, total_time, task_description, user_id=None, project_id=None):
         super().__init__()
 
         #Task id attribute
         self.task_id = task_id
+        #Attributes for the owner of the task and the project it
+        #belongs to (None when it is not in a project)
+        self.user_id = user_id
+        self.project_id = project_id
         #Attribute for the task name
         self.task_name = task_name
         #Attribute for the total time elapsed
@@ -206,38 +333,62 @@ class TaskWidget(QWidget):
 
         self.is_on = True
 
+        #The render scheduler of the task list this task is shown in. It is
+        #set by TimeTrackingApp, and while it is None the label is updated
+        #directly on every tick
+        self.render_scheduler = None
+
 
     #Updates the time to display it in hours, minute, and seconds
     def update_task_label(self):
         self.time_label.setText(f"{self.task_name} - {(self.total_time // 3600)}:{((self.total_time % 3600) // 60)}:{(self.total_time % 60)}")
 
-    #Function that serves as the timer for the task
+    #Function that serves as the timer for the task. The time is counted
+    #from the moment the task was started rather than by adding one second
+    #per tick, so it stays right when ticks are skipped. The wall clock time
+    #is only kept for the start of the interval saved in time_history
     def start_tracking(self):
         if self.is_on:
             #if the program is running
-            if not hasattr(self, "timer"):
-                self.timer = QTimer()
-                self.timer.timeout.connect(self.increment_time)
-            self.timer.start(1000)
+            self.start_timestamp = int(time.time())
+            self.tracking_started = time.monotonic()
+            self.tracked_before = self.total_time
+            if self.render_scheduler is not None:
+                self.render_scheduler.start(self)
+            else:
+                if not hasattr(self, "timer"):
+                    self.timer = QTimer()
+                    self.timer.timeout.connect(self.increment_time)
+                self.timer.start(1000)
             self.is_on = False
         else:
             #if the program is not running
-            if hasattr(self, "timer"):
-                self.timer.stop()
-                self.save_total_time()
-            self.is_on = True
+            self.stop_tracking()
 
     #Function that stops the timer of a task
     def stop_tracking(self):
-        if hasattr(self, "timer"):
-            self.timer.stop()
+        if not self.is_on:
+            self.update_total_time()
+            if self.render_scheduler is not None:
+                self.render_scheduler.stop(self)
+            else:
+                self.timer.stop()
             self.save_total_time()
+            self.save_time_history()
+            self.update_task_label()
+        self.is_on = True
 
-    #Function that increments the total time by 1
+    #Function that sets the total time to the time tracked before the
+    #task was started plus the seconds since it was started
+    def update_total_time(self):
+        self.total_time = self.tracked_before + round(time.monotonic() - self.tracking_started)
+
+    #Function that runs every second on the task's own timer when the task
+    #is not shown by a render scheduler
     def increment_time(self):
-        self.total_time += 1
-        self.update_task_label()
+        self.update_total_time()
         self.save_total_time()
+        self.update_task_label()
 
     #Function that saves the total elapsed time and saves it
     #in the database
@@ -251,6 +402,29 @@ class TaskWidget(QWidget):
         conn.commit()
         conn.close()
 
+    #Function that saves the interval since the timer was started
+    #as a row in the time_history table used by the analytics
+    def save_time_history(self):
+        start_timestamp = getattr(self, "start_timestamp", None)
+        if start_timestamp is None:
+            return
+        self.start_timestamp = None
+
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        #Using an SQL query, the code below inserts the interval into the
+        #history table, copying the user id from the task given a task id.
+        #The end is the start plus the seconds added to the total, so both
+        #are counted on the same clock even if the wall clock was changed
+        cursor.execute(
+            "INSERT INTO time_history (task_id, user_id, start_time, end_time) "
+            "SELECT task_id, user_id, ?, ? FROM task_list WHERE task_id = ?",
+            (start_timestamp, start_timestamp + self.total_time - self.tracked_before, self.task_id))
+
+        conn.commit()
+        conn.close()
+
 
     #Function that deletes a task from the task list and deletes
     #it from the database as well
@@ -259,12 +433,31 @@ class TaskWidget(QWidget):
         cursor = conn.cursor()
 
         #Using an SQL query, the code below deletes a task from the task list table
-        #in the database given a task id
+        #in the database given a task id. Its rows in time_history are kept, so
+        #past reports do not change when a task is deleted
         cursor.execute("DELETE FROM task_list WHERE task_id = ?", (self.task_id,))
+        cursor.execute("DELETE FROM task_tags WHERE task_id = ?", (self.task_id,))
 
         conn.commit()
         conn.close()
 
+        if self.render_scheduler is not None:
+            self.render_scheduler.forget(self)
+
+        #The code below removes the row of the task from the task list
+        #it is shown in, so no empty row is left behind
+        task_list = self.parentWidget()
+        while task_list is not None and not isinstance(task_list, QListWidget):
+            task_list = task_list.parentWidget()
+        if task_list is not None:
+            #The row under the widget is checked first, so the whole list
+            #is only searched if the widget is not laid out on its row
+            row = task_list.indexAt(self.geometry().center()).row()
+            if row < 0 or task_list.itemWidget(task_list.item(row)) is not self:
+                row = next((index for index in range(task_list.count())
+                            if task_list.itemWidget(task_list.item(index)) is self), -1)
+            if row >= 0:
+                task_list.takeItem(row)
         self.setParent(None)
 
 
@@ -297,6 +490,26 @@ class TaskWidget(QWidget):
         task_description_edit = QTextEdit(self.task_description)
         vbox.addWidget(task_description_edit)
 
+        #Creates a drop down to choose the project of the task, where
+        #subprojects are indented below their parent project
+        projects = Projects(self.user_id)
+        project_label = QLabel("Project:")
+        vbox.addWidget(project_label)
+
+        project_edit = QComboBox()
+        project_edit.addItem("(No project)", None)
+        for project_id, project_name, depth in projects_in_tree_order(projects.load_projects()):
+            project_edit.addItem("    " * depth + project_name, project_id)
+        project_edit.setCurrentIndex(max(project_edit.findData(self.project_id), 0))
+        vbox.addWidget(project_edit)
+
+        #Creates an input bar to enter the tags of the task separated by commas
+        tags_label = QLabel("Tags (comma separated):")
+        vbox.addWidget(tags_label)
+
+        tags_edit = QLineEdit(", ".join(projects.load_task_tags(self.task_id)))
+        vbox.addWidget(tags_edit)
+
         #Creates a variable to store two buttons for the window which are OK and Cancel
         button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         vbox.addWidget(button_box)
@@ -316,23 +529,192 @@ class TaskWidget(QWidget):
         #saved into the database and into the task list in the application
         if result == QDialog.DialogCode.Accepted:
 
-            #The code below updates the task name and description
-            self.task_name = task_name_edit.text()
-            self.task_description = task_description_edit.toPlainText()
+            #The code below saves the project and tags of the task
+            self.project_id = project_edit.currentData()
+            projects.set_task_project(self.task_id, self.project_id)
+            tag_names = sorted({tag.strip() for tag in tags_edit.text().split(",") if tag.strip()})
+            projects.set_task_tags(self.task_id, tag_names)
 
-            conn = sqlite3.connect(database)
-            cursor = conn.cursor()
+            self.save_task_details(task_name_edit.text(), task_description_edit.toPlainText())
 
-            #The code below updates the task name and description in the
-            #database given a task id
-            cursor.execute(
-                "UPDATE task_list SET task_name = ?, task_description = ? WHERE task_id = ?",
-                (self.task_name, self.task_description, self.task_id))
+    #Function that updates the task name and description
+    #and saves them in the database
+    def save_task_details(self, task_name, task_description):
+        self.task_name = task_name
+        self.task_description = task_description
 
-            conn.commit()
-            conn.close()
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
 
-            self.update_task_label()
+        #The code below updates the task name and description in the
+        #database given a task id
+        cursor.execute(
+            "UPDATE task_list SET task_name = ?, task_description = ? WHERE task_id = ?",
+            (self.task_name, self.task_description, self.task_id))
+
+        conn.commit()
+        conn.close()
+
+        self.update_task_label()
+
+'''
+The render scheduler runs the one timer shared by every running task in the task list. On each tick the
+running tasks bring their total time up to date and save it, and the labels of the rows on screen are
+repainted. While the window is hidden or minimized nothing is repainted and the timer slows down to one
+tick a minute, which only saves the totals; when the window is shown again the totals catch up from the
+time each task was started. Rows scrolled out of view are only repainted when they are scrolled back. It
+also measures wakeups and renders per second.
+'''
+class RenderScheduler(QObject):
+    #Number of seconds the wakeup and render rates are averaged over
+    RATE_WINDOW = 10
+
+    #Milliseconds between ticks while the window is hidden
+    HIDDEN_INTERVAL = 60000
+
+    def __init__(self, task_list):
+        super().__init__()
+
+        #The task list whose rows are rendered and the window it is
+        #shown in (known once the task list has been placed in one)
+        self.task_list = task_list
+        self.watched_window = None
+
+        #Task widgets that are running, and task widgets whose label no
+        #longer matches their total time
+        self.running_widgets = set()
+        self.dirty_widgets = set()
+
+        #One timer ticks every running task. A precise timer keeps the
+        #ticks one second apart, so the labels advance by one each time
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.interval = 1000
+
+        #Times of recent wakeups and label renders, used to measure their rates
+        self.wakeups = deque()
+        self.renders = deque()
+        self.started = time.monotonic()
+
+        #The task list is watched for being shown or resized, and its
+        #scroll bar for rows being scrolled into view
+        self.task_list.installEventFilter(self)
+        self.task_list.verticalScrollBar().valueChanged.connect(self.render_visible)
+
+    #Adds a task widget that was just started to the running tasks and
+    #starts the timer, slowed down if the window cannot be seen
+    def start(self, task_widget):
+        self.running_widgets.add(task_widget)
+        if not self.timer.isActive():
+            self.timer.start(self.interval if self.is_window_visible() else self.HIDDEN_INTERVAL)
+
+    #Removes a task widget that was stopped from the running tasks and
+    #stops the timer once no task is running
+    def stop(self, task_widget):
+        self.running_widgets.discard(task_widget)
+        self.dirty_widgets.discard(task_widget)
+        if not self.running_widgets:
+            self.timer.stop()
+
+    #Drops a task widget that is being deleted, so it is never ticked or rendered again
+    def forget(self, task_widget):
+        self.stop(task_widget)
+
+    #Records one wakeup of the application, such as a timer firing
+    def record_wakeup(self):
+        self.record(self.wakeups)
+
+    #Adds the current time to a list of event times, dropping the
+    #times that are older than the rate window
+    def record(self, events):
+        now = time.monotonic()
+        events.append(now)
+        self.trim(events, now)
+
+    def trim(self, events, now):
+        while events and events[0] < now - self.RATE_WINDOW:
+            events.popleft()
+
+    #Returns True if the window holding the task list is shown, not
+    #minimized, and has the task list on screen
+    def is_window_visible(self):
+        self.watch_window()
+        window = self.task_list.window()
+        return window.isVisible() and not window.isMinimized() and self.task_list.isVisible()
+
+    #Returns True if any part of the task widget's row is on screen
+    def is_row_visible(self, task_widget):
+        return not task_widget.visibleRegion().isEmpty()
+
+    #Installs the event filter on the window once the task list has been
+    #placed in one, so that minimizing and restoring are noticed
+    def watch_window(self):
+        window = self.task_list.window()
+        if window is not self.watched_window and window is not self.task_list:
+            if self.watched_window is not None:
+                self.watched_window.removeEventFilter(self)
+            window.installEventFilter(self)
+            self.watched_window = window
+
+    #Brings the total time of every running task up to date, saves it
+    #and marks its label as out of date
+    def update_running(self):
+        for task_widget in self.running_widgets:
+            task_widget.update_total_time()
+            task_widget.save_total_time()
+            self.dirty_widgets.add(task_widget)
+
+    #Runs on the shared timer once a second. The first tick after the
+    #window was hidden slows the timer down, and hidden ticks only save
+    def tick(self):
+        self.record_wakeup()
+        self.update_running()
+        if not self.is_window_visible():
+            if self.timer.interval() != self.HIDDEN_INTERVAL:
+                self.timer.setInterval(self.HIDDEN_INTERVAL)
+            return
+        self.render_visible()
+
+    #Updates the label of every out of date row that is on screen
+    def render_visible(self, *args):
+        if not self.dirty_widgets or not self.is_window_visible():
+            return
+        for task_widget in list(self.dirty_widgets):
+            if self.is_row_visible(task_widget):
+                task_widget.update_task_label()
+                self.record(self.renders)
+                self.dirty_widgets.discard(task_widget)
+
+    #Catches up as soon as the window is shown, restored or resized
+    def eventFilter(self, watched, event):
+        if event.type() in (QEvent.Type.Show, QEvent.Type.WindowStateChange, QEvent.Type.Resize):
+            QTimer.singleShot(0, self.resume)
+        return False
+
+    #Brings the running tasks up to date and speeds the timer up again if
+    #the window can be seen again, then renders what became visible
+    def resume(self):
+        if self.running_widgets and self.is_window_visible() and self.timer.interval() != self.interval:
+            self.update_running()
+            self.timer.start(self.interval)
+        self.render_visible()
+
+    #Returns the average number of events per second in the rate window
+    def rate(self, events):
+        now = time.monotonic()
+        self.trim(events, now)
+        return len(events) / max(min(now - self.started, self.RATE_WINDOW), 1)
+
+    def wakeups_per_second(self):
+        return self.rate(self.wakeups)
+
+    def renders_per_second(self):
+        return self.rate(self.renders)
+
+    #Returns the rates as text for the settings dialog
+    def statistics_text(self):
+        return f"Wakeups/s: {self.wakeups_per_second():.1f}  Renders/s: {self.renders_per_second():.1f}"
 
 '''
 Settings is the storehouse for all user preferences from the user_settings table,
@@ -380,6 +762,187 @@ class Settings:
         self.preferences["show_calendar"] = not self.preferences["show_calendar"]
         self.save_preferences()
 
+'''
+Projects handles a user's nested projects and tags from the projects, project_closure, tags and
+task_tags tables. Totals for a project and all of its subprojects are read with one indexed query
+through the closure table, so they stay fast however deep the hierarchy is.
+'''
+class Projects:
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    #This function creates a project below parent_id (or at the top
+    #level when parent_id is None) and returns its project id
+    def create_project(self, project_name, parent_id=None):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        cursor.execute("INSERT INTO projects (user_id, parent_id, project_name) VALUES (?, ?, ?)",
+                       (self.user_id, parent_id, project_name))
+        project_id = cursor.lastrowid
+
+        #The new project is its own ancestor at depth 0, and is one level
+        #deeper than every ancestor of its parent
+        cursor.execute(
+            "INSERT INTO project_closure (ancestor_id, descendant_id, depth) "
+            "SELECT ancestor_id, ?, depth + 1 FROM project_closure WHERE descendant_id = ? "
+            "UNION ALL SELECT ?, ?, 0",
+            (project_id, parent_id, project_id, project_id))
+
+        conn.commit()
+        conn.close()
+        return project_id
+
+    #This function returns a list of (project_id, parent_id, project_name)
+    #for every project of the user, with parents before their children
+    def load_projects(self):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT p.project_id, p.parent_id, p.project_name FROM projects p "
+            "JOIN project_closure c ON c.descendant_id = p.project_id "
+            "WHERE p.user_id = ? GROUP BY p.project_id ORDER BY MAX(c.depth), p.project_name",
+            (self.user_id,))
+        projects = cursor.fetchall()
+
+        conn.close()
+        return projects
+
+    #This function returns the total time of a project and all of its
+    #subprojects with a single query through the closure table
+    def project_total(self, project_id):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT COALESCE(SUM(t.total_time), 0) FROM project_closure c "
+            "JOIN task_list t ON t.project_id = c.descendant_id WHERE c.ancestor_id = ?",
+            (project_id,))
+        total_time = cursor.fetchone()[0]
+
+        conn.close()
+        return total_time
+
+    #This function returns a dictionary of project_id -> (task count, total time)
+    #rolled up over every subproject, for all of the user's projects at once
+    def rollup_totals(self):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        #Tasks are first summed per project, so the closure table is only
+        #joined once per project rather than once per task
+        cursor.execute(
+            "WITH direct AS (SELECT project_id, COUNT(*) AS task_count, SUM(total_time) AS total_time "
+            "FROM task_list WHERE user_id = ? AND project_id IS NOT NULL GROUP BY project_id) "
+            "SELECT c.ancestor_id, SUM(d.task_count), SUM(d.total_time) FROM direct d "
+            "JOIN project_closure c ON c.descendant_id = d.project_id GROUP BY c.ancestor_id",
+            (self.user_id,))
+        totals = {project_id: (task_count, total_time) for project_id, task_count, total_time in cursor.fetchall()}
+
+        conn.close()
+        return totals
+
+    #This function returns the task count and total time of the user's
+    #tasks that are not in any project
+    def unassigned_totals(self):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT COUNT(*), COALESCE(SUM(total_time), 0) FROM task_list "
+                       "WHERE user_id = ? AND project_id IS NULL", (self.user_id,))
+        totals = cursor.fetchone()
+
+        conn.close()
+        return totals
+
+    #This function returns a list of (tag name, task count, total time)
+    #for every tag of the user
+    def tag_totals(self):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT g.tag_name, COUNT(t.task_id), COALESCE(SUM(t.total_time), 0) FROM tags g "
+            "JOIN task_tags tt ON tt.tag_id = g.tag_id JOIN task_list t ON t.task_id = tt.task_id "
+            "WHERE g.user_id = ? GROUP BY g.tag_id ORDER BY g.tag_name",
+            (self.user_id,))
+        totals = cursor.fetchall()
+
+        conn.close()
+        return totals
+
+    #This function moves a task into a project (or out of every
+    #project when project_id is None)
+    def set_task_project(self, task_id, project_id):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        cursor.execute("UPDATE task_list SET project_id = ? WHERE task_id = ?", (project_id, task_id))
+
+        conn.commit()
+        conn.close()
+
+    #This function returns the sorted tag names of a task
+    def load_task_tags(self, task_id):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT g.tag_name FROM task_tags tt JOIN tags g ON g.tag_id = tt.tag_id "
+                       "WHERE tt.task_id = ? ORDER BY g.tag_name", (task_id,))
+        tag_names = [row[0] for row in cursor.fetchall()]
+
+        conn.close()
+        return tag_names
+
+    #This function replaces the tags of a task, creating any
+    #tag names the user has not used before
+    def set_task_tags(self, task_id, tag_names):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
+
+        cursor.execute("DELETE FROM task_tags WHERE task_id = ?", (task_id,))
+        for tag_name in tag_names:
+            cursor.execute("INSERT OR IGNORE INTO tags (user_id, tag_name) VALUES (?, ?)", (self.user_id, tag_name))
+            cursor.execute(
+                "INSERT OR IGNORE INTO task_tags (task_id, tag_id) "
+                "SELECT ?, tag_id FROM tags WHERE user_id = ? AND tag_name = ?",
+                (task_id, self.user_id, tag_name))
+
+        conn.commit()
+        conn.close()
+
+#Returns a dictionary of project_id -> the names of the project and its parents
+#joined as a path, e.g. "Clients / Acme / Website"
+def project_path_names(projects):
+    parents = {project_id: (parent_id, project_name) for project_id, parent_id, project_name in projects}
+    paths = {}
+    for project_id in parents:
+        names = []
+        ancestor_id = project_id
+        while ancestor_id is not None:
+            ancestor_id, project_name = parents[ancestor_id]
+            names.append(project_name)
+        paths[project_id] = " / ".join(reversed(names))
+    return paths
+
+
+#Orders the (project_id, parent_id, project_name) rows from load_projects so that every
+#project directly follows its parent, and returns (project_id, project_name, depth) rows
+def projects_in_tree_order(projects):
+    children = {}
+    for project_id, parent_id, project_name in projects:
+        children.setdefault(parent_id, []).append((project_id, project_name))
+
+    ordered = []
+    stack = [(project_id, project_name, 0) for project_id, project_name in reversed(children.get(None, []))]
+    while stack:
+        project_id, project_name, depth = stack.pop()
+        ordered.append((project_id, project_name, depth))
+        for child_id, child_name in reversed(children.get(project_id, [])):
+            stack.append((child_id, child_name, depth + 1))
+    return ordered
+
 '''
 This module is a dialog widget as a member of the TimeTrackingApp that will handle
 dialog between the system and the user for updating preferences or reaching a logout state.
@@ -400,6 +963,10 @@ class SettingsDialog(QDialog):
         self.logout_button.clicked.connect(self.logout)
         layout.addWidget(self.logout_button)
 
+        #Shows how often the running timers wake the application up
+        self.render_statistics_label = QLabel(parent.render_scheduler.statistics_text())
+        layout.addWidget(self.render_statistics_label)
+
     def toggle_calendar(self, state):
         self.parent().toggle_calendar(state)
 
@@ -446,12 +1013,135 @@ class CalendarWindow(QWidget):
             self.label.setText("Date Is : " + date_in_string)
 
 
+"""
+This class represents an analytics window which
+displays statistics over the user's tracked time
+history, such as time of day and weekday totals
+"""
+class AnalyticsWindow(QWidget):
+
+    def __init__(self, user_id):
+            super().__init__()
+
+            #sets the window size, title, and icon
+            self.setGeometry(200, 200, 700, 400)
+            self.setWindowTitle("Analytics")
+            self.setWindowIcon(QIcon('python.png'))
+
+            #vbox is a variable for the layout of the
+            #analytics window elements
+            vbox = QVBoxLayout()
+
+            #The report is computed by the analytics module in the
+            #computer's time zone, following daylight saving time,
+            #and shown in a read only text box
+            statistics = TimeTrackingAnalytics.compute_statistics(database, user_id,
+                                                                  TimeTrackingAnalytics.local_utc_offsets)
+            task_names = TimeTrackingAnalytics.load_task_names(database, user_id)
+
+            self.report = QTextEdit()
+            self.report.setReadOnly(True)
+            self.report.setFont(QFont("Courier", 10))
+            self.report.setPlainText(TimeTrackingAnalytics.format_report(statistics, task_names))
+
+            vbox.addWidget(self.report)
+
+            self.setLayout(vbox)
+
+
+"""
+This class represents a projects window which
+shows the user's projects as a tree with the time
+rolled up over every subproject, and the time per tag
+"""
+class ProjectsWindow(QWidget):
+
+    def __init__(self, user_id):
+            super().__init__()
+
+            self.projects = Projects(user_id)
+
+            #sets the window size, title, and icon
+            self.setGeometry(200, 200, 700, 400)
+            self.setWindowTitle("Projects")
+            self.setWindowIcon(QIcon('python.png'))
+
+            #vbox is a variable for the layout of the
+            #projects window elements
+            vbox = QVBoxLayout()
+
+            #Creates a tree of projects with the task count and total time
+            #of each project including all of its subprojects
+            self.project_tree = QTreeWidget()
+            self.project_tree.setHeaderLabels(["Project", "Tasks", "Total Time"])
+            vbox.addWidget(self.project_tree)
+
+            #Creates a list of tags with the task count and total time of each tag
+            self.tag_tree = QTreeWidget()
+            self.tag_tree.setHeaderLabels(["Tag", "Tasks", "Total Time"])
+            self.tag_tree.setRootIsDecorated(False)
+            vbox.addWidget(self.tag_tree)
+
+            #Creates a button to create a project below the selected project
+            create_project_button = QPushButton("Create Project")
+            create_project_button.clicked.connect(self.create_project)
+            vbox.addWidget(create_project_button)
+
+            self.setLayout(vbox)
+
+            self.load_projects()
+
+    #Formats a number of seconds the same way as the task labels
+    def format_time(self, total_time):
+            return f"{(total_time // 3600)}:{((total_time % 3600) // 60)}:{(total_time % 60)}"
+
+    #This function fills the project tree and tag list. The totals of
+    #every project come from one grouped query through the closure table
+    def load_projects(self):
+            self.project_tree.clear()
+            self.tag_tree.clear()
+
+            totals = self.projects.rollup_totals()
+            items = {}
+            for project_id, parent_id, project_name in self.projects.load_projects():
+                task_count, total_time = totals.get(project_id, (0, 0))
+                item = QTreeWidgetItem([project_name, str(task_count), self.format_time(total_time)])
+                item.setData(0, Qt.ItemDataRole.UserRole, project_id)
+                if parent_id in items:
+                    items[parent_id].addChild(item)
+                else:
+                    self.project_tree.addTopLevelItem(item)
+                items[project_id] = item
+
+            task_count, total_time = self.projects.unassigned_totals()
+            self.project_tree.addTopLevelItem(
+                QTreeWidgetItem(["(No project)", str(task_count), self.format_time(total_time)]))
+            self.project_tree.expandAll()
+
+            for tag_name, task_count, total_time in self.projects.tag_totals():
+                self.tag_tree.addTopLevelItem(QTreeWidgetItem([tag_name, str(task_count), self.format_time(total_time)]))
+
+    #This function asks for a project name and creates the project
+    #below the selected project, or at the top level if none is selected
+    def create_project(self):
+            project_name, ok = QInputDialog.getText(self, "Create Project", "Project Name:")
+            if ok and project_name:
+                selected = self.project_tree.currentItem()
+                parent_id = selected.data(0, Qt.ItemDataRole.UserRole) if selected else None
+                self.projects.create_project(project_name, parent_id)
+                self.load_projects()
+
+
 '''
 The TimeTrackingApp class will control the task list creation, format its layout, handle the
 link to calendar creation/viewing, as well as act like a homepage in the stacked global widget. It
 must be created with an application already instilled and will be specific to each user_id. 
 '''
 class TimeTrackingApp(QWidget):
+    #Number of rows above and below the visible ones that also get a task
+    #widget, so that scrolling a little shows them straight away
+    ROW_MARGIN = 10
+
     def __init__(self, user_id):
         super().__init__()
 
@@ -476,6 +1166,16 @@ class TimeTrackingApp(QWidget):
         self.calendar_button.clicked.connect(self.show_calendar_window)
         layout.addWidget(self.calendar_button, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight)
 
+        #The code below creates a button to view the analytics and places it below the calendar button
+        self.analytics_button = QPushButton("View Analytics")
+        self.analytics_button.clicked.connect(self.show_analytics_window)
+        layout.addWidget(self.analytics_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
+
+        #The code below creates a button to view the projects and places it below the analytics button
+        self.projects_button = QPushButton("View Projects")
+        self.projects_button.clicked.connect(self.show_projects_window)
+        layout.addWidget(self.projects_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
+
         #The code below creates a button to view the settings and places it below the calendar button
         self.settings_button = QPushButton("Settings")
         self.settings_button.clicked.connect(self.show_settings_dialog)
@@ -487,8 +1187,16 @@ class TimeTrackingApp(QWidget):
 
         #The code below creates a list of created tasks displayed
         #in the window
+        #Task rows only get a task widget while they are on screen (or while
+        #their task runs), so the list stays fast with many thousands of
+        #tasks. shown_items holds the rows that currently have a widget
         self.task_list = QListWidget()
+        self.task_list.setUniformItemSizes(True)
+        self.render_scheduler = RenderScheduler(self.task_list)
+        self.row_size = TaskWidget(0, "", 0, "").sizeHint()
+        self.shown_items = []
         self.load_tasks()
+        self.task_list.verticalScrollBar().valueChanged.connect(self.show_visible_rows)
         layout.addWidget(self.task_list)
 
         #The code below creates a button to create a task
@@ -531,20 +1239,124 @@ class TimeTrackingApp(QWidget):
         cursor = conn.cursor()
         #Using a SQL query, the code below selects the task and its attributes
         #from the database given a user id
-        cursor.execute("SELECT task_id, task_name, total_time, task_description FROM task_list WHERE user_id = ?",
-                       (self.user_id,))
-
-        #The code below adds the tasks into the task list
-        for task_id, task_name, total_time, task_description in cursor.fetchall():
-            task_widget = TaskWidget(task_id, task_name, total_time, task_description)
-            task_list_item = QListWidgetItem()
-            task_list_item.setSizeHint(task_widget.sizeHint())
+        cursor.execute("SELECT task_id, task_name, total_time, task_description, project_id FROM task_list "
+                       "WHERE user_id = ?", (self.user_id,))
 
-            self.task_list.addItem(task_list_item)
-            self.task_list.setItemWidget(task_list_item, task_widget)
+        tasks_by_project = {}
+        for row in cursor.fetchall():
+            tasks_by_project.setdefault(row[4], []).append(row)
 
         conn.close()
 
+        #The code below adds the tasks into the task list grouped by project,
+        #in the order of the project tree, under a header row for each project.
+        #Tasks without a project come last, so that new tasks join their group
+        projects = Projects(self.user_id).load_projects()
+        if projects:
+            project_paths = project_path_names(projects)
+            groups = [(project_paths[project_id], project_id)
+                      for project_id, project_name, depth in projects_in_tree_order(projects)]
+            groups.append(("No project", None))
+        else:
+            groups = [(None, None)]
+
+        for header, project_id in groups:
+            if header is not None:
+                self.add_project_header(header)
+            for task in tasks_by_project.get(project_id, []):
+                self.add_task_row(task)
+
+    #The function below inserts a header row naming a project into the task
+    #list. Header rows cannot be selected and have no task widget
+    def add_project_header(self, header):
+        header_item = QListWidgetItem(header)
+        header_item.setFlags(Qt.ItemFlag.NoItemFlags)
+        header_item.setSizeHint(self.row_size)
+        header_font = header_item.font()
+        header_font.setBold(True)
+        header_item.setFont(header_font)
+        self.task_list.addItem(header_item)
+
+    #The function below inserts a row for a task into the task list. The row
+    #holds the (task_id, task_name, total_time, task_description, project_id)
+    #of the task and gets its task widget once it is scrolled into view
+    def add_task_row(self, task):
+        task_list_item = QListWidgetItem()
+        task_list_item.setSizeHint(self.row_size)
+        task_list_item.setData(Qt.ItemDataRole.UserRole, task)
+        self.task_list.addItem(task_list_item)
+        return task_list_item
+
+    #The function below creates the task widget of a task row and hands it
+    #the render scheduler which updates its label
+    def show_row(self, task_list_item):
+        task_id, task_name, total_time, task_description, project_id = task_list_item.data(Qt.ItemDataRole.UserRole)
+        task_widget = TaskWidget(task_id, task_name, total_time, task_description, self.user_id, project_id)
+        task_widget.render_scheduler = self.render_scheduler
+        self.task_list.setItemWidget(task_list_item, task_widget)
+        self.shown_items.append(task_list_item)
+        return task_widget
+
+    #The function below removes the task widget of a task row, keeping the
+    #task's current attributes in the row for when it is shown again
+    def hide_row(self, task_list_item):
+        task_widget = self.task_list.itemWidget(task_list_item)
+        task_list_item.setData(Qt.ItemDataRole.UserRole,
+                               (task_widget.task_id, task_widget.task_name, task_widget.total_time,
+                                task_widget.task_description, task_widget.project_id))
+        self.render_scheduler.forget(task_widget)
+        self.task_list.removeItemWidget(task_list_item)
+
+    #The function below gives a task widget to the task rows on screen and
+    #removes it from the rows that were scrolled away, except for running tasks
+    def show_visible_rows(self, *args):
+        if not self.task_list.isVisible() or self.task_list.count() == 0:
+            return
+        viewport = self.task_list.viewport()
+        first_row = self.task_list.indexAt(QPoint(0, 0)).row()
+        last_row = self.task_list.indexAt(QPoint(0, viewport.height() - 1)).row()
+        if last_row < 0:
+            last_row = self.task_list.count() - 1
+        first_row = max(first_row - self.ROW_MARGIN, 0)
+        last_row = min(last_row + self.ROW_MARGIN, self.task_list.count() - 1)
+
+        shown_items = self.shown_items
+        self.shown_items = []
+        for task_list_item in shown_items:
+            task_widget = self.task_list.itemWidget(task_list_item)
+            #Rows of deleted tasks are no longer in the list
+            if task_widget is None:
+                continue
+            if first_row <= self.task_list.row(task_list_item) <= last_row or not task_widget.is_on:
+                self.shown_items.append(task_list_item)
+            else:
+                self.hide_row(task_list_item)
+
+        for row in range(first_row, last_row + 1):
+            task_list_item = self.task_list.item(row)
+            is_task_row = task_list_item.data(Qt.ItemDataRole.UserRole) is not None
+            if is_task_row and self.task_list.itemWidget(task_list_item) is None:
+                self.show_row(task_list_item)
+
+    #The function below scrolls a task row into view and returns its task widget
+    def show_task_row(self, row):
+        task_list_item = self.task_list.item(row)
+        self.task_list.scrollToItem(task_list_item)
+        self.show_visible_rows()
+        task_widget = self.task_list.itemWidget(task_list_item)
+        if task_widget is None:
+            task_widget = self.show_row(task_list_item)
+        return task_widget
+
+    #Rows are given their task widgets once the task list has its size
+    def showEvent(self, event):
+        super().showEvent(event)
+        QTimer.singleShot(0, self.show_visible_rows)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        QTimer.singleShot(0, self.show_visible_rows)
+
     #This function is used to create a task and
     #the user is asked to enter a name for the task
     def create_task(self):
@@ -553,33 +1365,31 @@ class TimeTrackingApp(QWidget):
 
         #If the task is created by selecting the 'OK' button
         if ok and task_name:
-            conn = sqlite3.connect(database)
-            cursor = conn.cursor()
+            self.add_task(task_name)
 
-            #Using an SQL query, the code below inserts a task into the database
-            #table named 'task_list' given a user id and task name
-            cursor.execute("INSERT INTO task_list (user_id, task_name) VALUES (?, ?)", (self.user_id, task_name))
-            conn.commit()
+    #This function saves a new task with the given name in the database
+    #and adds it to the task list
+    def add_task(self, task_name):
+        conn = sqlite3.connect(database)
+        cursor = conn.cursor()
 
-            task_id = cursor.lastrowid
+        #Using an SQL query, the code below inserts a task into the database
+        #table named 'task_list' given a user id and task name
+        cursor.execute("INSERT INTO task_list (user_id, task_name) VALUES (?, ?)", (self.user_id, task_name))
+        conn.commit()
 
-            conn.close()
+        task_id = cursor.lastrowid
 
-            #the code below creates a task widget object which represents a task
-            #and it is defined again as a task list item
-            task_widget = TaskWidget(task_id, task_name, 0, "")
-            task_list_item = QListWidgetItem()
-            task_list_item.setSizeHint(task_widget.sizeHint())
+        conn.close()
 
-            #The code below inserts a task into the task list
-            self.task_list.addItem(task_list_item)
-            self.task_list.setItemWidget(task_list_item, task_widget)
+        #the code below inserts a row for the task into the task list and
+        #creates the task widget object which represents the task
+        return self.show_row(self.add_task_row((task_id, task_name, 0, "", None)))
 
     #The function below stops all tasks in a task list. It iterates through
-    #each task item and stops the timer for each one
+    #the running tasks and stops the timer for each one
     def stop_all_tasks(self):
-        for index in range(self.task_list.count()):
-            task_widget = self.task_list.itemWidget(self.task_list.item(index))
+        for task_widget in list(self.render_scheduler.running_widgets):
             task_widget.stop_tracking()
 
     #The function below shows the window to display
@@ -596,8 +1406,10 @@ class TimeTrackingApp(QWidget):
     def apply_preferences(self):
         self.calendar.setVisible(self.user_settings.preferences["show_calendar"])
 
-    #This function logs the user out of the application
+    #This function logs the user out of the application. The running tasks
+    #are stopped first, as logging in again creates a new task list
     def logout(self):
+        self.stop_all_tasks()
         self.parent().setCurrentIndex(0)
 
     #The function below shows a calendar window
@@ -607,6 +1419,18 @@ class TimeTrackingApp(QWidget):
         self.w = CalendarWindow()
         self.w.show()
 
+    #The function below shows an analytics window for
+    #the user by creating an AnalyticsWindow object
+    def show_analytics_window(self, checked):
+        self.analytics_window = AnalyticsWindow(self.user_id)
+        self.analytics_window.show()
+
+    #The function below shows the projects window for
+    #the user by creating a ProjectsWindow object
+    def show_projects_window(self, checked):
+        self.projects_window = ProjectsWindow(self.user_id)
+        self.projects_window.show()
+
 '''
 This module acts as the program's main composed structure inclusive of the login, registration, and
 and main window widgets (stacked format). It handles login and registration validation as well
@@ -653,6 +1477,14 @@ class TimeTrackingApplication(QMainWindow):
         self.registration_page.back_to_login_button.clicked.connect(self.switch_to_login)
 
 
+    #When the window is closed, the running tasks of every logged in user are
+    #stopped, so that their total time and time history are saved
+    def closeEvent(self, event):
+        for index in range(self.stacked_widget.count()):
+            page = self.stacked_widget.widget(index)
+            if isinstance(page, TimeTrackingApp):
+                page.stop_all_tasks()
+        super().closeEvent(event)
 
     #The function below allows a user to log in to the application given that they
     #created an account and enter both the correct username and password
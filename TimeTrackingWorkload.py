@@ -0,0 +1,410 @@
+'''
+Synthetic workload generator for reproducing production-scale time_tracking.db databases. Given the same
+seed and options it always creates the same users, projects, tags, tasks and years of time history, and
+writes them with bulk inserts inside a single transaction. It can also replay a scripted mix of
+start/stop/edit/create/delete actions against a running TimeTrackingApp at a configured rate.
+'''
+import sys
+import time
+import sqlite3
+import argparse
+from datetime import date
+
+import numpy as np
+
+import TimeTrackingSoftware
+from TimeTrackingSoftware import create_database_and_tables
+
+#The generated history ends on this date unless told otherwise, so that
+#the same seed gives the same database whatever day it is run on
+DEFAULT_END_DATE = "2025-01-01"
+
+#Number of users generated and inserted per batch
+USER_BATCH_SIZE = 200
+
+#Secondary indexes dropped while loading and rebuilt afterwards by
+#create_database_and_tables, which is faster than updating them per row
+BULK_LOAD_INDEXES = ["idx_time_history_user_start", "idx_time_history_long", "idx_task_list_user",
+                     "idx_task_list_project", "idx_task_tags_tag", "idx_project_closure_descendant"]
+
+#Password given to every generated account (at least 8 characters, as
+#required by the registration page)
+DEFAULT_PASSWORD = "password123"
+
+FIRST_NAMES = ["alex", "sam", "jordan", "taylor", "morgan", "casey", "riley", "jamie", "avery", "quinn",
+               "maria", "li", "ahmed", "olga", "kenji", "fatima", "diego", "priya", "noah", "emma"]
+LAST_NAMES = ["smith", "garcia", "chen", "patel", "kim", "nguyen", "muller", "rossi", "silva", "khan",
+              "johnson", "lopez", "ivanov", "sato", "brown", "dubois", "cohen", "okafor", "novak", "berg"]
+
+TASK_VERBS = ["Review", "Write", "Fix", "Plan", "Design", "Test", "Refactor", "Document", "Deploy", "Research",
+              "Prepare", "Update", "Debug", "Analyse", "Present"]
+TASK_NOUNS = ["pull requests", "quarterly report", "login page", "database schema", "release notes",
+              "customer feedback", "sprint backlog", "API client", "test suite", "onboarding guide",
+              "budget forecast", "build pipeline", "dashboard", "invoice export", "team meeting"]
+DESCRIPTION_TEMPLATES = ["Work on the {noun} for the {project} project.",
+                         "Follow up on the {noun} discussed last week.",
+                         "Time spent on the {noun} ({project}).",
+                         ""]
+
+PROJECT_NAMES = ["Website", "Mobile App", "Internal Tools", "Client Work", "Research", "Operations"]
+SUBPROJECT_NAMES = ["Frontend", "Backend", "Support", "Planning", "Maintenance"]
+TAG_NAMES = ["billable", "urgent", "meeting", "deep-work", "admin", "review", "learning"]
+
+TASK_DISTRIBUTIONS = ["poisson", "lognormal", "zipf", "uniform"]
+
+#Zipf draws use exponent 2 and are capped to keep single users reasonable. The
+#uncapped distribution has no finite mean, so draws are scaled by the mean of the
+#capped one: sum(k * P(k)) below the cap plus the cap times P(draw >= cap), where
+#P(k) = k^-2 / zeta(2) and zeta(2) = pi^2 / 6
+ZIPF_EXPONENT = 2.0
+ZIPF_CAP = 1000
+_zipf_values = np.arange(1, ZIPF_CAP)
+_zipf_probabilities = _zipf_values ** -ZIPF_EXPONENT / (np.pi ** 2 / 6)
+ZIPF_CAPPED_MEAN = float((_zipf_values * _zipf_probabilities).sum() + ZIPF_CAP * (1 - _zipf_probabilities.sum()))
+
+
+#Returns the number of tasks of each user drawn from the named distribution
+#with the given mean. Every user has at least one task
+def draw_task_counts(rng, users, distribution, mean_tasks):
+    if distribution == "poisson":
+        counts = rng.poisson(mean_tasks, users)
+    elif distribution == "lognormal":
+        sigma = 1.0
+        counts = rng.lognormal(np.log(mean_tasks) - sigma ** 2 / 2, sigma, users)
+    elif distribution == "zipf":
+        counts = np.minimum(rng.zipf(ZIPF_EXPONENT, users), ZIPF_CAP) * mean_tasks / ZIPF_CAPPED_MEAN
+    elif distribution == "uniform":
+        counts = rng.integers(1, 2 * mean_tasks, users, endpoint=True)
+    else:
+        raise ValueError(f"Unknown task distribution: {distribution}")
+    return np.maximum(np.round(counts).astype(np.int64), 1)
+
+
+'''
+WorkloadGenerator writes a synthetic dataset into a database created with create_database_and_tables.
+All randomness comes from one NumPy generator seeded with seed, and ids are assigned in insertion order
+starting after the rows that already exist, so the output only depends on the seed and the options.
+'''
+class WorkloadGenerator:
+    def __init__(self, database, seed=0, users=100, task_distribution="poisson", mean_tasks=12, years=2,
+                 sessions_per_day=5, end_date=DEFAULT_END_DATE, utc_offset=0):
+        self.database = database
+        self.rng = np.random.default_rng(seed)
+        self.users = users
+        self.task_distribution = task_distribution
+        self.mean_tasks = mean_tasks
+        self.years = years
+        self.sessions_per_day = sessions_per_day
+        self.utc_offset = utc_offset
+
+        #The generated days are every day of the given number of years up
+        #to end_date, as day numbers since the unix epoch
+        last_day = (date.fromisoformat(end_date) - date(1970, 1, 1)).days
+        self.days = np.arange(last_day - int(round(years * 365)), last_day)
+        #Weekends (day number shifted by three so that Monday is 0) are
+        #worked far less often than weekdays
+        weekdays = (self.days + 3) % 7
+        self.day_work_probability = np.where(weekdays < 5, 0.92, 0.08)
+
+        #Counts of the rows written, reported once generation has finished
+        self.row_counts = {}
+
+    #Generates the whole dataset and returns the number of rows written per table
+    def generate(self, progress=None):
+        create_database_and_tables(self.database)
+        conn = sqlite3.connect(self.database)
+        cursor = conn.cursor()
+
+        #Durability is not needed while a throwaway dataset is loaded, and
+        #everything is written in one transaction
+        cursor.execute("PRAGMA journal_mode = MEMORY")
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("PRAGMA cache_size = -262144")
+        cursor.execute("BEGIN")
+        for index_name in BULK_LOAD_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+        next_ids = {table: (cursor.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}").fetchone()[0] + 1)
+                    for table, column in [("users", "user_id"), ("task_list", "task_id"),
+                                          ("projects", "project_id"), ("tags", "tag_id")]}
+        self.row_counts = {table: 0 for table in ["users", "user_settings", "projects", "project_closure", "tags",
+                                                  "task_list", "task_tags", "time_history"]}
+
+        task_counts = draw_task_counts(self.rng, self.users, self.task_distribution, self.mean_tasks)
+        for batch_start in range(0, self.users, USER_BATCH_SIZE):
+            rows = {table: [] for table in self.row_counts}
+            for user_index in range(batch_start, min(batch_start + USER_BATCH_SIZE, self.users)):
+                self.generate_user(next_ids, user_index, int(task_counts[user_index]), rows)
+            self.insert_rows(cursor, rows)
+            if progress:
+                progress(min(batch_start + USER_BATCH_SIZE, self.users), self.users)
+
+        conn.commit()
+        conn.close()
+
+        #Recreates the indexes dropped above
+        create_database_and_tables(self.database)
+        return self.row_counts
+
+    #Adds the rows of one user, its projects, tags, tasks and history to rows
+    def generate_user(self, next_ids, user_index, task_count, rows):
+        rng = self.rng
+        user_id = next_ids["users"]
+        next_ids["users"] += 1
+        username = f"{FIRST_NAMES[user_index % len(FIRST_NAMES)]}.{LAST_NAMES[user_index // len(FIRST_NAMES) % len(LAST_NAMES)]}{user_id}"
+        rows["users"].append((user_id, username, DEFAULT_PASSWORD))
+        rows["user_settings"].append((user_id, int(rng.random() < 0.8)))
+
+        #A few top level projects, each with a few subprojects. The closure
+        #rows are the project itself and, for subprojects, their parent
+        project_ids = []
+        project_names = []
+        for project_name in rng.choice(PROJECT_NAMES, rng.integers(1, 4), replace=False):
+            parent_id = next_ids["projects"]
+            next_ids["projects"] += 1
+            rows["projects"].append((parent_id, user_id, None, str(project_name)))
+            rows["project_closure"].append((parent_id, parent_id, 0))
+            project_ids.append(parent_id)
+            project_names.append(str(project_name))
+            for subproject_name in rng.choice(SUBPROJECT_NAMES, rng.integers(0, 3), replace=False):
+                project_id = next_ids["projects"]
+                next_ids["projects"] += 1
+                rows["projects"].append((project_id, user_id, parent_id, str(subproject_name)))
+                rows["project_closure"].extend([(project_id, project_id, 0), (parent_id, project_id, 1)])
+                project_ids.append(project_id)
+                project_names.append(f"{project_name} / {subproject_name}")
+
+        tag_ids = []
+        for tag_name in rng.choice(TAG_NAMES, rng.integers(1, len(TAG_NAMES)), replace=False):
+            rows["tags"].append((next_ids["tags"], user_id, str(tag_name)))
+            tag_ids.append(next_ids["tags"])
+            next_ids["tags"] += 1
+
+        #Tasks are named from a verb and a noun, and one in five is left
+        #outside of any project
+        first_task_id = next_ids["task_list"]
+        next_ids["task_list"] += task_count
+        verbs = rng.integers(0, len(TASK_VERBS), task_count)
+        nouns = rng.integers(0, len(TASK_NOUNS), task_count)
+        projects = rng.integers(0, len(project_ids), task_count)
+        unassigned = rng.random(task_count) < 0.2
+        templates = rng.integers(0, len(DESCRIPTION_TEMPLATES), task_count)
+
+        task_ids, start_time, end_time = self.generate_history(first_task_id, task_count)
+        total_times = np.bincount(task_ids - first_task_id, weights=end_time - start_time,
+                                  minlength=task_count).astype(np.int64)
+
+        for index in range(task_count):
+            task_id = first_task_id + index
+            noun = TASK_NOUNS[nouns[index]]
+            project_index = projects[index]
+            description = DESCRIPTION_TEMPLATES[templates[index]].format(noun=noun,
+                                                                         project=project_names[project_index])
+            rows["task_list"].append((task_id, user_id, f"{TASK_VERBS[verbs[index]]} {noun}",
+                                      int(total_times[index]), description,
+                                      None if unassigned[index] else project_ids[project_index]))
+            for tag_id in rng.choice(tag_ids, rng.integers(0, min(2, len(tag_ids)) + 1), replace=False):
+                rows["task_tags"].append((task_id, int(tag_id)))
+
+        rows["time_history"].append((task_ids, np.full(len(task_ids), user_id), start_time, end_time))
+
+    #Returns the (task_id, start_time, end_time) arrays of one user's history.
+    #Each worked day has a number of back to back sessions with short breaks,
+    #starting in the morning, and a few tasks receive most of the time
+    def generate_history(self, first_task_id, task_count):
+        rng = self.rng
+        worked_days = self.days[rng.random(len(self.days)) < self.day_work_probability]
+        sessions = rng.poisson(self.sessions_per_day, len(worked_days))
+        session_days = np.repeat(worked_days, sessions)
+        session_count = len(session_days)
+        if session_count == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+
+        #Session lengths have a median of 40 minutes, and breaks between
+        #sessions a median of 10 minutes
+        durations = np.clip(rng.lognormal(np.log(40 * 60), 0.8, session_count), 60, 6 * 3600).astype(np.int64)
+        breaks = np.clip(rng.lognormal(np.log(10 * 60), 1.0, session_count), 0, 3 * 3600).astype(np.int64)
+
+        #Each session starts after the previous sessions and breaks of the
+        #same day, so the running sum is restarted at the first session of
+        #every day
+        steps = durations + breaks
+        cumulative = np.cumsum(steps) - steps
+        day_starts = np.repeat(cumulative[np.cumsum(sessions[sessions > 0]) - sessions[sessions > 0]],
+                               sessions[sessions > 0])
+        day_offsets = np.repeat(np.clip(rng.normal(8.5 * 3600, 3600, len(worked_days)), 5 * 3600, 12 * 3600),
+                                sessions).astype(np.int64)
+        start_time = session_days * 86400 - self.utc_offset + day_offsets + (cumulative - day_starts) + breaks
+        end_time = start_time + durations
+
+        #Tasks are picked with zipf-like weights in a random order per user
+        weights = 1.0 / np.arange(1, task_count + 1)
+        task_order = rng.permutation(task_count)
+        task_ids = first_task_id + task_order[rng.choice(task_count, session_count, p=weights / weights.sum())]
+        return task_ids.astype(np.int64), start_time, end_time
+
+    #Writes one batch of generated rows with executemany
+    def insert_rows(self, cursor, rows):
+        statements = {
+            "users": "INSERT INTO users (user_id, username, password) VALUES (?, ?, ?)",
+            "user_settings": "INSERT INTO user_settings (user_id, show_calendar) VALUES (?, ?)",
+            "projects": "INSERT INTO projects (project_id, user_id, parent_id, project_name) VALUES (?, ?, ?, ?)",
+            "project_closure": "INSERT INTO project_closure (ancestor_id, descendant_id, depth) VALUES (?, ?, ?)",
+            "tags": "INSERT INTO tags (tag_id, user_id, tag_name) VALUES (?, ?, ?)",
+            "task_list": "INSERT INTO task_list (task_id, user_id, task_name, total_time, task_description, "
+                         "project_id) VALUES (?, ?, ?, ?, ?, ?)",
+            "task_tags": "INSERT INTO task_tags (task_id, tag_id) VALUES (?, ?)",
+        }
+        for table, statement in statements.items():
+            cursor.executemany(statement, rows[table])
+            self.row_counts[table] += len(rows[table])
+
+        #History is kept as arrays until here and handed to executemany as
+        #one stream of tuples in start order per user
+        for task_ids, user_ids, start_time, end_time in rows["time_history"]:
+            cursor.executemany("INSERT INTO time_history (task_id, user_id, start_time, end_time) VALUES (?, ?, ?, ?)",
+                               zip(task_ids.tolist(), user_ids.tolist(), start_time.tolist(), end_time.tolist()))
+            self.row_counts["time_history"] += len(task_ids)
+
+
+#Returns a deterministic list of (action, position) pairs for replaying traffic, where
+#position in [0, 1) picks the task row the action applies to
+def generate_script(seed, count):
+    rng = np.random.default_rng(seed)
+    actions = rng.choice(["toggle", "edit", "create", "delete"], count, p=[0.7, 0.15, 0.1, 0.05])
+    positions = rng.random(count)
+    return list(zip(actions.tolist(), positions.tolist()))
+
+
+'''
+TrafficReplayer applies a script from generate_script to a TimeTrackingApp on a QTimer, one action every
+1 / rate seconds, through the same TaskWidget and TimeTrackingApp methods the buttons use.
+'''
+class TrafficReplayer:
+    def __init__(self, time_tracking_app, script, rate, on_finished=None):
+        self.app = time_tracking_app
+        self.script = script
+        self.position = 0
+        self.on_finished = on_finished
+        self.started = None
+
+        self.timer = TimeTrackingSoftware.QTimer()
+        self.timer.timeout.connect(self.step)
+        self.interval = max(int(1000 / rate), 1)
+
+    def start(self):
+        self.started = time.monotonic()
+        self.timer.start(self.interval)
+
+    #Applies the next action of the script
+    def step(self):
+        if self.position >= len(self.script):
+            self.timer.stop()
+            self.app.stop_all_tasks()
+            if self.on_finished:
+                self.on_finished(self)
+            return
+
+        action, position = self.script[self.position]
+        self.position += 1
+
+        #The row at the drawn position is used, or the first task row after it
+        #when it is a project header
+        task_list = self.app.task_list
+        row = int(position * task_list.count())
+        while row < task_list.count() and task_list.item(row).data(TimeTrackingSoftware.Qt.ItemDataRole.UserRole) is None:
+            row += 1
+
+        if action == "create" or row >= task_list.count():
+            self.app.add_task(f"Replay task {self.position}")
+            return
+
+        task_widget = self.app.show_task_row(row)
+        if action == "toggle":
+            task_widget.start_tracking()
+        elif action == "edit":
+            task_widget.save_task_details(f"{task_widget.task_name.split(' #')[0]} #{self.position}",
+                                          task_widget.task_description)
+        elif action == "delete":
+            task_widget.stop_tracking()
+            task_widget.delete_task()
+
+    #Returns the number of actions applied per second so far
+    def achieved_rate(self):
+        return self.position / max(time.monotonic() - self.started, 1e-9)
+
+
+#Opens the application for one user, the same way logging in does, and replays the
+#script against it. Returns the application's exit code, or 1 if the user does not exist
+def replay(database, user_id, script, rate):
+    TimeTrackingSoftware.database = database
+    create_database_and_tables(database)
+
+    conn = sqlite3.connect(database)
+    user = conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    conn.close()
+    if user is None:
+        print(f"User {user_id} not found in {database}.", file=sys.stderr)
+        return 1
+
+    app = TimeTrackingSoftware.QApplication(sys.argv)
+    main_window = TimeTrackingSoftware.TimeTrackingApplication()
+    main_window.setGeometry(100, 100, 600, 400)
+
+    time_tracking_app = TimeTrackingSoftware.TimeTrackingApp(user_id)
+    time_tracking_app.apply_preferences()
+    main_window.stacked_widget.addWidget(time_tracking_app)
+    main_window.stacked_widget.setCurrentIndex(main_window.stacked_widget.count() - 1)
+    main_window.setWindowTitle("Time Tracking Application (replay)")
+    main_window.show()
+
+    def finished(replayer):
+        print(f"Replayed {replayer.position} actions at {replayer.achieved_rate():.1f}/s. "
+              f"{time_tracking_app.render_scheduler.statistics_text()}")
+        app.quit()
+
+    replayer = TrafficReplayer(time_tracking_app, script, rate, finished)
+    replayer.start()
+    return app.exec()
+
+
+'''
+Command line entry point, e.g.
+python TimeTrackingWorkload.py time_tracking.db --users 1000 --years 3 --seed 7
+python TimeTrackingWorkload.py time_tracking.db --replay-user 1 --actions 500 --rate 20
+'''
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic time_tracking.db or replay traffic against it.")
+    parser.add_argument("database", help="path to the time_tracking.db file")
+    parser.add_argument("--seed", type=int, default=0, help="seed for all random choices")
+    parser.add_argument("--users", type=int, default=100, help="number of users to generate")
+    parser.add_argument("--task-distribution", choices=TASK_DISTRIBUTIONS, default="poisson",
+                        help="distribution of the number of tasks per user")
+    parser.add_argument("--mean-tasks", type=float, default=12, help="mean number of tasks per user")
+    parser.add_argument("--years", type=float, default=2, help="years of time history per user")
+    parser.add_argument("--sessions-per-day", type=float, default=5, help="mean tracked sessions per worked day")
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="last day of the generated history")
+    parser.add_argument("--utc-offset", type=float, default=0, help="local time offset from UTC in hours")
+    parser.add_argument("--replay-user", type=int, default=None,
+                        help="instead of generating, open the app for this user and replay scripted traffic")
+    parser.add_argument("--actions", type=int, default=200, help="number of replayed actions")
+    parser.add_argument("--rate", type=float, default=10, help="replayed actions per second")
+    args = parser.parse_args(argv)
+
+    if args.replay_user is not None:
+        return replay(args.database, args.replay_user, generate_script(args.seed, args.actions), args.rate)
+
+    generator = WorkloadGenerator(args.database, args.seed, args.users, args.task_distribution, args.mean_tasks,
+                                  args.years, args.sessions_per_day, args.end_date, int(args.utc_offset * 3600))
+    started = time.monotonic()
+    row_counts = generator.generate(lambda done, total: print(f"[{done}/{total}] users", file=sys.stderr))
+    elapsed = time.monotonic() - started
+
+    total_rows = sum(row_counts.values())
+    print(", ".join(f"{table}: {count}" for table, count in row_counts.items()))
+    print(f"{total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())